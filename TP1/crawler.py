@@ -1,9 +1,32 @@
 import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, SoupStrainer
+from urllib.parse import urlparse, urljoin, urldefrag
+from urllib.robotparser import RobotFileParser
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from collections import deque
+import threading
 import json
+import re
 import os
 
+try:
+    import lxml  # noqa: F401
+    PARSER = "lxml"
+except ImportError:
+    PARSER = "html.parser"
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# parse_html ne lit que le <title> et le <body> : inutile de construire le reste de l'arbre
+ONLY_TITLE_BODY = SoupStrainer(["title", "body"])
+
+# Identifiant d'une review, porté par une classe de la forme "review-<id>"
+_REVIEW_ID_RE = re.compile(r"(?:^|\s)review-(\S+)")
+
 headers = {
     "User-Agent":
         "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -11,14 +34,30 @@ headers = {
         "Chrome/120.0.0.0 Safari/537.36"
 }
 
+USER_AGENT = headers["User-Agent"]
+
+# Nombre de pages téléchargées en parallèle
+MAX_WORKERS = 8
+
+# Session partagée : les connexions HTTP sont réutilisées d'une requête à l'autre
+SESSION = requests.Session()
+SESSION.headers.update(headers)
+for prefix in ("http://", "https://"):
+    SESSION.mount(prefix, HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS))
+
+# robots.txt déjà lus, par nom d'hôte
+_robots_cache = {}
+_robots_lock = threading.Lock()
+
 
 # Fonction qui s’assure que le crawler a le droit de parser une page
 def can_crawl(url):
     """
     Check if the crawler is allowed to crawl a given URL by examining the robots.txt file.
 
-    This function sends a request to the robots.txt file of the domain and checks if
-    crawling is disallowed for all user agents.
+    The robots.txt file at the root of the URL's host is downloaded and parsed only once,
+    then kept in a cache shared by all the download threads. If it cannot be retrieved,
+    crawling is allowed.
 
     Args:
         url (str): The URL to check for crawling permission.
@@ -26,13 +65,39 @@ def can_crawl(url):
     Returns:
         bool: True if crawling is allowed, False otherwise.
     """
-    robots_url = url + "/robots.txt"
-    response = requests.get(robots_url)
-    if response.status_code == 200:
-        robots_txt = response.text
-        if "Disallow: /" in robots_txt:
-            return False
-    return True
+    parsed_url = urlparse(url)
+    host = parsed_url.netloc
+    with _robots_lock:
+        robots = _robots_cache.get(host)
+        if robots is None:
+            robots = RobotFileParser()
+            response = SESSION.get(f"{parsed_url.scheme}://{host}/robots.txt")
+            if response.status_code == 200:
+                robots.parse(response.text.splitlines())
+            else:
+                robots.allow_all = True
+            _robots_cache[host] = robots
+    return robots.can_fetch(USER_AGENT, url)
+
+
+# Fonction qui télécharge une page si le robots.txt l'autorise
+def fetch_page(url):
+    """
+    Download the content of a webpage if crawling it is allowed.
+
+    This function is run in worker threads so that several pages can be
+    downloaded at the same time.
+
+    Args:
+        url (str): The URL of the webpage to download.
+
+    Returns:
+        bytes: The raw content of the page, or None if crawling is not allowed.
+    """
+    if not can_crawl(url):
+        return None
+    response = SESSION.get(url)
+    return response.content
 
 
 # Fonction pour parser le HTML et extraire les informations
@@ -48,63 +113,77 @@ def parse_html(url, soup):
         soup (BeautifulSoup): The parsed HTML content of the webpage.
 
     Returns:
-        list: A list of dictionaries, each containing product information.
-              Each dictionary has keys: 'url', 'title', 'description', 'features',
-              'links', 'reviews'.
+        list: A list containing one dictionary with the product information of the page,
+              with keys: 'url', 'title', 'description', 'features', 'links', 'reviews'.
     """
-    url = url
-    products = []
-    product_elements = soup.find_all("body")
-    for element in product_elements:
-
-        name = element.find("h3", class_="card-title product-title mb-3")
-        if name:
-            name = name.text.strip()
-        else:
-            name = soup.find("title").text.strip()
-
-        description_text = element.find("p", class_="product-description")
-        if description_text:
-            description_text = description_text.text.strip()
-        else:
-            description_text = ""
-
-        features = element.find_all("tr", class_="feature")
-        links = element.find_all("a")
-        reviews = element.find_all("div", class_="mt-4")
-
-        reviews_list = []
-        for review in reviews:
-            classes = review.get("class", [])
-            review_id = None
-            for cls in classes:
-                if cls.startswith("review-") and cls != "review":
-                    review_id = cls.replace("review-", "")
-                    break
-
-            rating = len(review.find_all("svg"))
-
-            p = review.find("p")
-            content = p.text.strip() if p else None
-
-            reviews_list.append({
-                "id": review_id,
-                "rating": rating,
-                "content": content
-            })
-
-        products.append({
-            "url": url,
-            "title": name,
-            "description": description_text,
-            "features": {feature.find("td", class_="feature-label")
-                         .text.strip():
-                         feature.find("td", class_="feature-value")
-                         .text.strip() for feature in features},
-            "links": [link.get("href") for link in links],
-            "reviews": reviews_list
+    body = soup.body or soup
+
+    name = body.find("h3", class_="card-title product-title mb-3")
+    if name:
+        name = name.text.strip()
+    else:
+        name = soup.find("title").text.strip()
+
+    description_text = body.find("p", class_="product-description")
+    if description_text:
+        description_text = description_text.text.strip()
+    else:
+        description_text = ""
+
+    features = body.find_all("tr", class_="feature")
+    links = body.find_all("a")
+    reviews = body.find_all("div", class_="mt-4")
+
+    features_dict = {}
+    for feature in features:
+        cells = feature.find_all("td", limit=2)
+        if len(cells) == 2:
+            features_dict[cells[0].get_text(strip=True)] = cells[1].get_text(strip=True)
+
+    reviews_list = []
+    for review in reviews:
+        match = _REVIEW_ID_RE.search(" ".join(review.get("class", [])))
+        review_id = match.group(1) if match else None
+
+        rating = len(review.find_all("svg"))
+
+        p = review.find("p")
+        content = p.text.strip() if p else None
+
+        reviews_list.append({
+            "id": review_id,
+            "rating": rating,
+            "content": content
         })
-    return products
+
+    return [{
+        "url": url,
+        "title": name,
+        "description": description_text,
+        "features": features_dict,
+        "links": [link.get("href") for link in links],
+        "reviews": reviews_list
+    }]
+
+
+# Fonction exécutée dans les processus de parsing : seuls des octets et des dictionnaires
+# transitent entre processus, jamais d'objet BeautifulSoup
+def parse_page(url, content):
+    """
+    Parse the raw content of a webpage to extract product information.
+
+    This function builds the BeautifulSoup object and calls parse_html. It is run in
+    worker processes so that several pages can be parsed at the same time.
+
+    Args:
+        url (str): The URL of the webpage being parsed.
+        content (bytes): The raw HTML content of the webpage.
+
+    Returns:
+        list: The product information returned by parse_html.
+    """
+    soup = BeautifulSoup(content, PARSER, parse_only=ONLY_TITLE_BODY)
+    return parse_html(url, soup)
 
 
 def crawl(url, nb_pages):
@@ -112,6 +191,8 @@ def crawl(url, nb_pages):
     Crawl a website starting from a given URL and extract product information from pages.
 
     This function performs a breadth-first search crawl, prioritizing product pages.
+    Pages are downloaded in batches of up to MAX_WORKERS concurrent requests, then
+    the pages of each batch are parsed in parallel in a pool of processes.
     It respects robots.txt and limits the number of pages crawled.
 
     Args:
@@ -122,50 +203,58 @@ def crawl(url, nb_pages):
         list: A list of product dictionaries extracted from the crawled pages.
     """
     output = []
-    urls_priority = []
-    urls_non_priority = []
-    visited = set()
+    queue = deque([url])
+    queued = {url}
     pages_max = 50
     i = 0
 
-    urls_priority.append(url)
-
     if nb_pages > pages_max:
         nb_pages = pages_max
         print(f"Le nombre de pages demandé dépasse la limite maximale de "
               f"{pages_max}. Le nombre de pages sera limité à {pages_max}.")
 
-    for url in urls_priority:
-
-        if i >= nb_pages:
-            print("Page maximum to crawl:", nb_pages)
-            break
-
-        print("Crawling URL:", url)
-        if not url.startswith("http://") and not url.startswith("https://"):
-            print(f"Skipping invalid URL: {url}")
-            continue
-        if can_crawl(url):
-            response = requests.get(url, headers=headers)
-            soup = BeautifulSoup(response.content, "html.parser")
-            # print(soup.title)
-            products = parse_html(url, soup)
-            list_url = products[0]['links']
-            for url in list_url:
-                if url is None:
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor, \
+            ProcessPoolExecutor(max_workers=os.cpu_count()) as parser_pool:
+        while queue and i < nb_pages:
+
+            # Les pages d'un même lot sont téléchargées en parallèle
+            batch = []
+            batch_size = min(MAX_WORKERS, nb_pages - i)
+            while queue and len(batch) < batch_size:
+                url = queue.popleft()
+                print("Crawling URL:", url)
+                if not url.startswith("http://") and not url.startswith("https://"):
+                    print(f"Skipping invalid URL: {url}")
+                    continue
+                batch.append(url)
+
+            fetched_urls = []
+            contents = []
+            for url, content in zip(batch, executor.map(fetch_page, batch)):
+                if content is None:
+                    print("Crawling not allowed for this URL.", url)
                     continue
-                path = urlparse(url).path
-                if path.startswith("/product/") and url not in visited:
-                    urls_priority.append(url)
-                    visited.add(url)
-                elif url not in urls_non_priority:
-                    urls_non_priority.append(url)
-            # print(products)
-            output.extend(products)
-            i += 1
-            print(i)
-        else:
-            print("Crawling not allowed for this URL.", url)
+                fetched_urls.append(url)
+                contents.append(content)
+
+            # Les pages téléchargées sont parsées en parallèle
+            parsed_pages = parser_pool.map(parse_page, fetched_urls, contents)
+            for url, products in zip(fetched_urls, parsed_pages):
+                # Seules les pages produits sont ajoutées à la file, sous forme absolue et sans ancre
+                for link in products[0]['links']:
+                    if not link:
+                        continue
+                    link = urldefrag(urljoin(url, link)).url
+                    if link not in queued and urlparse(link).path.startswith("/product/"):
+                        queue.append(link)
+                        queued.add(link)
+                # print(products)
+                output.extend(products)
+                i += 1
+                print(i)
+
+    if i >= nb_pages:
+        print("Page maximum to crawl:", nb_pages)
 
     return output
 
@@ -187,9 +276,12 @@ def main():
 
     output = crawl(url, nb_pages)
 
-    with open(jsonl_file, "w", encoding="utf-8") as f:
+    with open(jsonl_file, "wb") as f:
         for page in output:
-            f.write(json.dumps(page, ensure_ascii=False) + "\n")
+            if orjson is not None:
+                f.write(orjson.dumps(page) + b"\n")
+            else:
+                f.write((json.dumps(page, ensure_ascii=False) + "\n").encode("utf-8"))
 
 if __name__ == "__main__":
     main()
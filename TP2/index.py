@@ -2,21 +2,35 @@ import pandas as pd
 from urllib.parse import urlparse, urljoin, parse_qs
 import json
 import os
-import spacy
+import string
+import sys
+from array import array
+from collections import defaultdict
+from functools import partial
+from spacy.lang.en.stop_words import STOP_WORDS
 
 try:
-    nlp = spacy.load("en_core_web_sm")
-except OSError:
-    spacy.cli.download("en_core_web_sm")
-    nlp = spacy.load("en_core_web_sm")
+    import orjson
+except ImportError:
+    orjson = None
+
+# La ponctuation est remplacée par des espaces ("cat-ear" -> "cat ear"). Les stopwords de spaCy
+# passent par la même table pour que les contractions ("'s", "n't") soient encore filtrées.
+_PUNCT_TBL = str.maketrans(string.punctuation, " " * len(string.punctuation))
+STOPS = frozenset(word for stop_word in STOP_WORDS for word in stop_word.translate(_PUNCT_TBL).split())
+
+# Champs textuels et features indexés par build_all_indexes, par nom d'index
+TEXT_FIELDS = {'index_title': 'title', 'index_description': 'description'}
+FEATURE_FIELDS = {'index_brand': 'brand', 'index_origin': 'made in', 'index_material': 'material'}
 
 
 def remove_stopwords_punctuation(text):
     """
     Remove stopwords and punctuation from the given text and return lowercase tokens.
 
-    This function uses spaCy to process the text, filtering out stopwords and punctuation,
-    and converts all tokens to lowercase.
+    The text is lowercased, punctuation is replaced by whitespace and the text is split,
+    then the tokens found in spaCy's English stopword list are filtered out. Tokens are
+    interned, so that a token shared by several indexes is stored only once.
 
     Args:
         text (str): The input text to process.
@@ -24,10 +38,7 @@ def remove_stopwords_punctuation(text):
     Returns:
         list: A list of lowercase tokens without stopwords and punctuation.
     """
-    nlp = spacy.load("en_core_web_sm")
-    doc = nlp(text)
-    tokens = [token.text.lower() for token in doc if not token.is_stop and not token.is_punct]
-    return tokens
+    return [sys.intern(word) for word in text.lower().translate(_PUNCT_TBL).split() if word not in STOPS]
 
 
 # Extraitre les informations de chaque URL : ID produit (numéro après la tld) et Variante (si présente)
@@ -67,12 +78,26 @@ def word_positions(tokens):
     Returns:
         dict: A dictionary where keys are tokens and values are lists of their positions (indices).
     """
-    positions = {}
+    positions = defaultdict(list)
     for index, token in enumerate(tokens):
-        if token not in positions:
-            positions[token] = []
         positions[token].append(index)
-    return positions
+    return dict(positions)
+
+
+# Ajouter les positions des tokens d'un texte à un index inversé
+def add_text_to_index(index, url, text):
+    """
+    Add the tokens of a text to an inverted index with their positions.
+
+    Args:
+        index (defaultdict): The inverted index to update, mapping tokens to dictionaries
+                             of URLs and positions.
+        url (str): The URL of the product the text belongs to.
+        text (str): The text to tokenize and index.
+    """
+    positions = word_positions(remove_stopwords_punctuation(text))
+    for token, token_positions in positions.items():
+        index[token][url] = token_positions
 
 
 # Création des index inversés pour les champs 'title' et 'description'
@@ -91,18 +116,14 @@ def create_inverted_index(data, field):
         dict: An inverted index dictionary where keys are tokens and values are dictionaries
               mapping URLs to lists of positions.
     """
-    index = {}
+    index = defaultdict(dict)
 
-    for url, text in zip(data['url'], data[field]):
-        tokens = remove_stopwords_punctuation(text)
-        positions = word_positions(tokens)
-        for token in tokens:
-            if token not in index:
-                index[token] = {}
-            index[token][url] = positions[token]
+    for url, text in zip(data['url'].to_numpy(), data[field].to_numpy()):
+        url = sys.intern(url)
+        add_text_to_index(index, url, text)
 
     print(f"L'index de {field} est créé.")
-    return index
+    return dict(index)
 
 
 # Création des index pour le reviews
@@ -111,6 +132,7 @@ def create_reviews_index(data):
     Create an index for product reviews, calculating statistics for each product.
 
     For each product, computes the total number of reviews, mean rating, and last rating.
+    The reviews are exploded to one row per review and aggregated with a pandas groupby.
 
     Args:
         data (pd.DataFrame): The dataframe containing product data with 'product_reviews' column.
@@ -118,22 +140,60 @@ def create_reviews_index(data):
     Returns:
         dict: A dictionary mapping URLs to review statistics: 'total_reviews', 'mean_mark', 'last_rating'.
     """
-    index = {}
-
-    for url, reviews in zip(data['url'], data['product_reviews']):
-        total_reviews = len(reviews)
-        mean_mark = sum(review['rating'] for review in reviews) / total_reviews if total_reviews > 0 else 0
-        last_rating = reviews[-1]['rating'] if total_reviews > 0 else None
-        index[url] = {
-            'total_reviews': total_reviews,
-            'mean_mark': mean_mark,
-            'last_rating': last_rating
-        }
-    
+    reviews = data[['url', 'product_reviews']].explode('product_reviews')
+    reviews['rating'] = reviews['product_reviews'].str.get('rating')
+    ratings = reviews.groupby('url', sort=False)['rating']
+
+    # Les produits sans review ont une seule ligne à NaN, ignorée par count, mean et last
+    last_rating = ratings.last().astype('Int64').astype(object)
+    stats = pd.DataFrame({
+        'total_reviews': ratings.count(),
+        'mean_mark': ratings.mean().fillna(0),
+        'last_rating': last_rating.where(last_rating.notna(), None)
+    })
+    index = stats.to_dict(orient='index')
+
     print("L'index des reviews est créé.")
     return index
 
 
+# Ajouter les tokens de la valeur d'une feature à un index de features
+def add_feature_to_index(index, doc_id, feature_value):
+    """
+    Add the tokens of a feature value to a feature index.
+
+    The products must be added in increasing order of doc_id, so that a product
+    can only be a duplicate of the last id of a posting list.
+
+    Args:
+        index (defaultdict): The feature index to update, mapping tokens to arrays of
+                             product ids (array('I')).
+        doc_id (int): The id of the product the feature belongs to (its row number).
+        feature_value (str): The value of the feature, or None if the product does not have it.
+    """
+    if not feature_value:
+        return
+    for token in remove_stopwords_punctuation(feature_value):
+        postings = index[token]
+        if not postings or postings[-1] != doc_id:
+            postings.append(doc_id)
+
+
+# Remplacer les ids des produits par leurs URLs
+def postings_to_urls(index, urls):
+    """
+    Convert the posting lists of a feature index from product ids to URLs.
+
+    Args:
+        index (dict): A feature index mapping tokens to arrays of product ids.
+        urls (list): The URLs of the products, indexed by product id.
+
+    Returns:
+        dict: A dictionary mapping tokens to lists of URLs.
+    """
+    return {token: [urls[doc_id] for doc_id in postings] for token, postings in index.items()}
+
+
 # Création des index inversés pour les features comme marque et origine.
 def create_features_index(data, feature):
     """
@@ -148,39 +208,80 @@ def create_features_index(data, feature):
     Returns:
         dict: A dictionary mapping tokens to lists of URLs that contain those tokens in the feature.
     """
-    index = {}
+    index = defaultdict(partial(array, 'I'))
 
-    for url, features in zip(data['url'], data['product_features']):
-        feature_value = features.get(feature)
-        feature_value = remove_stopwords_punctuation(feature_value) if feature_value else []
-        for token in feature_value:
-            if token not in index:
-                index[token] = set()
-            index[token].add(url)
+    for doc_id, features in enumerate(data['product_features'].to_numpy()):
+        add_feature_to_index(index, doc_id, features.get(feature))
 
-    index = {token: list(urls) for token, urls in index.items()}
+    index = postings_to_urls(index, data['url'].tolist())
     print(f"L'index de feature {feature} est créé.")
     return index
 
 
-def export_index_to_json(index, filename):
+# Création de tous les index en un seul parcours des données
+def build_all_indexes(data):
+    """
+    Create the title, description, reviews, brand, origin and material indexes at once.
+
+    The dataframe is traversed a single time: for each product, every field is tokenized
+    once and added to its index. The reviews index is computed by create_reviews_index.
+
+    Args:
+        data (pd.DataFrame): The dataframe containing the product data.
+
+    Returns:
+        dict: A dictionary mapping each index name (e.g., 'index_title') to the index,
+              with the same structure as returned by the create_*_index functions.
+    """
+    text_indexes = {name: defaultdict(dict) for name in TEXT_FIELDS}
+    feature_indexes = {name: defaultdict(partial(array, 'I')) for name in FEATURE_FIELDS}
+
+    columns = ['url', 'product_features', *TEXT_FIELDS.values()]
+    columns = [data[column].to_numpy() for column in columns]
+    for doc_id, (url, features, *texts) in enumerate(zip(*columns)):
+        url = sys.intern(url)
+        for index, text in zip(text_indexes.values(), texts):
+            add_text_to_index(index, url, text)
+        for name, feature in FEATURE_FIELDS.items():
+            add_feature_to_index(feature_indexes[name], doc_id, features.get(feature))
+
+    indexes = {name: dict(index) for name, index in text_indexes.items()}
+    indexes['index_reviews'] = create_reviews_index(data)
+    urls = data['url'].tolist()
+    for name, index in feature_indexes.items():
+        indexes[name] = postings_to_urls(index, urls)
+    print("Les index sont créés.")
+    return indexes
+
+
+def export_index_to_json(index, filename, pretty=False):
     """
     Export an index dictionary to a JSON file in the output_test directory.
 
     If the file already exists, it is removed before writing the new one.
+    The index is serialized with orjson when it is installed, and written in compact
+    form unless pretty is True.
 
     Args:
         index (dict): The index dictionary to export.
         filename (str): The base filename for the JSON file (without extension).
+        pretty (bool): Indent the JSON output to make it human-readable.
     """
     json_file = f"output_test/{filename}.json"
     if os.path.exists(json_file):
         print(f"Le fichier {json_file} existe déjà, suppression en cours.")
         os.remove(json_file)
 
-    index_json = json.dumps(index, indent=4)
+    if orjson is not None:
+        with open(json_file, 'wb') as f:
+            f.write(orjson.dumps(index, option=orjson.OPT_INDENT_2 if pretty else 0))
+        return
+
     with open(json_file, 'w', encoding='utf-8') as f:
-        f.write(index_json)
+        if pretty:
+            json.dump(index, f, ensure_ascii=False, indent=4)
+        else:
+            json.dump(index, f, ensure_ascii=False, separators=(",", ":"), check_circular=False)
 
 
 def main():
@@ -191,21 +292,10 @@ def main():
     brand, origin, material), and exports them to JSON files.
     """
     data = pd.read_json('input/products.jsonl', lines=True)
-    urls = data['url'].tolist()
 
-    index_title = create_inverted_index(data, 'title')
-    index_description = create_inverted_index(data, 'description')
-    index_reviews = create_reviews_index(data)
-    index_brand = create_features_index(data, 'brand')
-    index_origin = create_features_index(data, 'made in')
-    index_material = create_features_index(data, 'material')
-
-    export_index_to_json(index_title, 'index_title')
-    export_index_to_json(index_description, 'index_description')
-    export_index_to_json(index_reviews, 'index_reviews')
-    export_index_to_json(index_brand, 'index_brand')
-    export_index_to_json(index_origin, 'index_origin')
-    export_index_to_json(index_material, 'index_material')
+    indexes = build_all_indexes(data)
+    for filename, index in indexes.items():
+        export_index_to_json(index, filename)
     print("Les index sont exportés en format json.")
 
 